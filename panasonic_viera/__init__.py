@@ -1,24 +1,24 @@
 """Module to interact with your Panasonic Viera TV."""
 from enum import Enum
+from functools import lru_cache
 import logging
-import random
+import os
 import socket
 import base64
 import struct
 import hmac
-import hashlib
 from http import HTTPStatus
+import http.client
+import io
 import re
+import threading
+import time
 import asyncio
 from xml.etree import ElementTree
-import aiohttp.web
 import xmltodict
 from Crypto.Cipher import AES
 
-try:
-    from urllib.request import urlopen, Request, HTTPError, build_opener, HTTPHandler
-except ImportError:
-    from urllib2 import urlopen, Request, HTTPError, build_opener, HTTPHandler
+from urllib.error import HTTPError, URLError
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -37,12 +37,66 @@ TV_TYPE_NONENCRYPTED = 0
 TV_TYPE_ENCRYPTED = 1
 
 DEFAULT_PORT = 55000
+DEFAULT_TIMEOUT = 5
+
+SOAP_ENVELOPE = (
+    b'<?xml version="1.0" encoding="utf-8"?>'
+    b'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
+    b' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
+    b"<s:Body>%b</s:Body>"
+    b"</s:Envelope>"
+)
+
+PARAMS_MASTER_CHANNEL = "<InstanceID>0</InstanceID><Channel>Master</Channel>"
+PARAMS_SET_VOLUME = PARAMS_MASTER_CHANNEL + "<DesiredVolume>%d</DesiredVolume>"
+PARAMS_LAUNCH_WEB_BROWSER = (
+    "<X_AppType>vc_app</X_AppType><X_LaunchKeyword>resource_id=1063</X_LaunchKeyword>"
+)
+
+RE_CURRENT_VOLUME = re.compile(rb"<CurrentVolume>(\d+)<")
+RE_CURRENT_MUTE = re.compile(rb"<CurrentMute>([01])<")
+RE_APP = re.compile(r"product_id=(.*?)&apos;(.*?)&apos;")
+RE_ENC_RESULT = re.compile(rb"<X_EncResult>([^<]*)</X_EncResult>")
 
 BLOCK_SIZE = 16  # Bytes
 
+# TCP keepalive tuning for connections to the TV: idle time (TCP_KEEPALIVE on
+# macOS), probe interval and probe count
+KEEPALIVE_OPTIONS = (
+    ("TCP_KEEPIDLE", 60),
+    ("TCP_KEEPALIVE", 60),
+    ("TCP_KEEPINTVL", 10),
+    ("TCP_KEEPCNT", 3),
+)
 
-def pad(s):
-    return s + (BLOCK_SIZE - len(s) % BLOCK_SIZE) * chr(0)
+# HMAC key mask used for pairing (taken from libtvconnect.so)
+HMAC_KEY_MASK = bytes.fromhex(
+    "15c95ac2b08aa7eb4e228f811e34d04fa54ba7dcac9879fa8acda3fc244f3854"
+)
+
+
+@lru_cache(maxsize=64)
+def _soap_envelope(urn, action, body_elem):
+    """Return the SOAP envelope for an action with a %b slot for its params."""
+    return SOAP_ENVELOPE % (
+        f'<{body_elem}:{action} xmlns:{body_elem}="urn:{urn}">'
+        f"%b</{body_elem}:{action}>"
+    ).encode("utf-8")
+
+
+@lru_cache(maxsize=256)
+def _plain_soap_body(urn, action, body_elem, params):
+    """Return the SOAP body of a command that is not encrypted.
+
+    The params of key presses, app launches and the like come from a small set, so
+    the complete body is reused between calls.
+    """
+    return _soap_envelope(urn, action, body_elem) % str(params).encode("utf-8")
+
+
+def _swap_word_halves(data):
+    """Swap the two 16-bit halves of every 32-bit word in data."""
+    return b"".join(data[i + 2 : i + 4] + data[i : i + 2] for i in range(0, 16, 4))
 
 
 class Keys(Enum):
@@ -133,6 +187,11 @@ class Keys(Enum):
     HMDI_4 = "NRC_HDMI4-ONOFF"
 
 
+# X_SendKey params for every known key, looked up by member or by raw value
+KEY_EVENT_PARAMS = {key: f"<X_KeyEvent>{key.value}</X_KeyEvent>" for key in Keys}
+KEY_EVENT_PARAMS.update({key.value: params for key, params in KEY_EVENT_PARAMS.items()})
+
+
 class Apps(Enum):
     """Contains several app product IDs."""
 
@@ -155,6 +214,17 @@ class Apps(Enum):
     DEVELOPER = "0077777777777778"
 
 
+# X_LaunchApp params for every known app, looked up by member or by product ID
+LAUNCH_APP_PARAMS = {
+    app: "<X_AppType>vc_app</X_AppType>"
+    f"<X_LaunchKeyword>product_id={app.value}</X_LaunchKeyword>"
+    for app in Apps
+}
+LAUNCH_APP_PARAMS.update(
+    {app.value: params for app, params in LAUNCH_APP_PARAMS.items()}
+)
+
+
 class SOAPError(Exception):
     """This exception is thrown when a SOAP error happens."""
 
@@ -163,6 +233,123 @@ class EncryptionRequired(Exception):
     """This exception is thrown when encryption is required."""
 
 
+def _volume_params(volume):
+    if not 0 <= volume <= 100:
+        raise ValueError("Bad request to volume control. Must be between 0 and 100")
+    return PARAMS_SET_VOLUME % volume
+
+
+def _mute_params(enable):
+    data = "1" if enable else "0"
+    return f"{PARAMS_MASTER_CHANNEL}<DesiredMute>{data}</DesiredMute>"
+
+
+def _key_event_params(key):
+    params = KEY_EVENT_PARAMS.get(key)
+    if params is None:
+        params = f"<X_KeyEvent>{key}</X_KeyEvent>"
+    return params
+
+
+def _channel_keys(digits):
+    digits = str(digits)
+    if not (digits.isascii() and digits.isdigit()):
+        raise ValueError(f"Invalid channel number: {digits}")
+    return [Keys[f"NUM_{digit}"] for digit in digits]
+
+
+def _launch_app_params(app):
+    params = LAUNCH_APP_PARAMS.get(app)
+    if params is None:
+        keyword = "resource_id" if len(app) != 16 else "product_id"
+        params = (
+            "<X_AppType>vc_app</X_AppType>"
+            f"<X_LaunchKeyword>{keyword}={app}</X_LaunchKeyword>"
+        )
+    return params
+
+
+def _webpage_packet(url):
+    # The URL is sent with a one byte length prefix
+    url_bytes = url.encode("utf-8")
+    if len(url_bytes) > 255:
+        raise ValueError("URL must not be longer than 255 bytes")
+    return struct.pack(
+        f">7sB{len(url_bytes)}sx",
+        b"\xf4\x01\x01\x00\x00\x00\x00",
+        len(url_bytes),
+        url_bytes,
+    )
+
+
+def _connect_app_params(res, localip, localport):
+    """Return the params connecting the app launched with response res to us."""
+    session_id = ElementTree.fromstring(res).find(".//X_SessionId").text
+    return (
+        "<X_AppType>vc_app</X_AppType>"
+        f"<X_SessionId>{session_id}</X_SessionId>"
+        "<X_ConnectKeyword>panasonic-viera 0.2</X_ConnectKeyword>"
+        f"<X_ConnectAddr>{localip}:{localport}</X_ConnectAddr>"
+    )
+
+
+def _parse_apps(res):
+    # Only encrypted responses are decrypted to str
+    if isinstance(res, bytes):
+        res = res.decode("utf-8")
+
+    return {name: prod_id for prod_id, name in RE_APP.findall(res)}
+
+
+def _raise_soap_fault(ex, error_messages=None):
+    """Raise a SOAPError for a SOAP fault, re-raise any other HTTP error.
+
+    Returns if the fault carries neither a known error code nor a description.
+    """
+    if ex.code != 500:
+        raise ex  # Pass to the next handler
+    error_messages = error_messages or {}
+    root = ElementTree.fromstring(ex.fp.read())
+    error_code = root.find(".//{*}errorCode")
+    if error_code is not None and error_code.text in error_messages:
+        raise SOAPError(error_messages[error_code.text])
+    error_description = root.find(".//{*}errorDescription")
+    if error_description is not None:
+        raise SOAPError(error_description.text)
+
+
+def _raise_connection_error(ex):
+    """Raise an error talking to the TV the same way urlopen() did.
+
+    Timeouts are passed on as they are, anything else is wrapped in a URLError.
+    """
+    if isinstance(ex, (socket.timeout, TimeoutError)):
+        raise ex
+    raise URLError(ex) from ex
+
+
+class _TVConnection(http.client.HTTPConnection):
+    """HTTP connection to the TV that sends small requests without delay."""
+
+    def connect(self):
+        super().connect()
+        # Don't let Nagle's algorithm hold back requests until the TV ACKs
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Notice within about 90 seconds that an idle TV went away (e.g. was switched
+        # off), instead of only when the next request times out. The tuning options
+        # are not available on every platform, and some OS releases reject options
+        # Python knows about, so they are only applied where they work.
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in KEEPALIVE_OPTIONS:
+            if hasattr(socket, option):
+                try:
+                    self.sock.setsockopt(
+                        socket.IPPROTO_TCP, getattr(socket, option), value
+                    )
+                except OSError:
+                    pass
+
+
 class RemoteControl:
     """This class represents a Panasonic Viera TV Remote Control."""
 
@@ -174,6 +361,7 @@ class RemoteControl:
         encryption_key=None,
         listen_host=None,
         listen_port=DEFAULT_PORT,
+        timeout=DEFAULT_TIMEOUT,
     ):
         """Initialise the remote control."""
         self._host = host
@@ -182,11 +370,12 @@ class RemoteControl:
         self._enc_key = encryption_key
         self._listen_host = listen_host
         self._listen_port = listen_port
+        self._timeout = timeout
         self._session_key = None
         self._session_iv = None
         self._session_id = None
         self._session_seq_num = None
-        self._session_hmac_key = None
+        self._session_hmac = None
 
         self._service_to_sid = {}
         self._sid_to_service = {}
@@ -194,36 +383,76 @@ class RemoteControl:
         self._aiohttp_server = None
         self._server = None
 
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._local_ip = None
+        self._host_header = f"{self._host}:{self._port}"
+        self._base_url = URL_TEMPLATE.format(self._host, self._port, "")
+        self._soap_headers = {
+            "Host": self._host_header,
+            "Content-Type": "text/xml; charset=utf-8",
+        }
+        self._soap_action_headers = {}
+
         if self._app_id is None or self._enc_key is None:
             self._type = TV_TYPE_NONENCRYPTED
         else:
             self._type = TV_TYPE_ENCRYPTED
             self._derive_session_keys()
+
+        self._setup()
+
+    def _setup(self):
+        """Request a session, or determine if the TV uses encryption or not."""
+        if self._type == TV_TYPE_ENCRYPTED:
             self._request_session_id()
+            return
 
-        # Determine if the TV uses encryption or not
-        if self._type == TV_TYPE_NONENCRYPTED:
-            url = URL_TEMPLATE.format(self._host, self._port, URL_CONTROL_NRC_DEF)
-
-            _LOGGER.debug("Determining TV type\n")
-            res = urlopen(url, timeout=5).read()
-            root = ElementTree.fromstring(res)
-            for child in root:
-                if child.tag.endswith("actionList"):
-                    for subchild in child.iter():
-                        if (
-                            subchild.tag.endswith("name")
-                            and subchild.text == "X_GetEncryptSessionId"
-                        ):
-                            self._type = TV_TYPE_ENCRYPTED
-            tv_enc_type = (
-                "encrypted" if self._type == TV_TYPE_ENCRYPTED else "non-encrypted"
-            )
-            _LOGGER.debug("Determined TV type is %s\n", tv_enc_type)
+        _LOGGER.debug("Determining TV type\n")
+        res = self._request("GET", URL_CONTROL_NRC_DEF)
+        self._detect_type(res)
+
+    def _detect_type(self, res):
+        """Determine the TV type from its NRC service description."""
+        # The action name only shows up in the service description of TVs that
+        # support it, so there is no need to parse the document.
+        if b"X_GetEncryptSessionId" in res:
+            self._type = TV_TYPE_ENCRYPTED
+        tv_enc_type = (
+            "encrypted" if self._type == TV_TYPE_ENCRYPTED else "non-encrypted"
+        )
+        _LOGGER.debug("Determined TV type is %s\n", tv_enc_type)
 
     def soap_request(self, url, urn, action, params, body_elem="m"):
         """Send a SOAP request to the TV."""
+        res, is_encrypted = self._send_soap_request(url, urn, action, params, body_elem)
+        return self._parse_soap_response(res, is_encrypted)
 
+    def _send_soap_request(self, url, urn, action, params, body_elem="m"):
+        """Send a SOAP request and return the raw response, without decrypting it.
+
+        Commands whose result is not used skip the decryption this way.
+        """
+        soap_body, headers, is_encrypted = self._build_soap_request(
+            urn, action, params, body_elem
+        )
+
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        if debug:
+            _LOGGER.debug("Sending to %s:\n%s\n%s", url, headers, soap_body)
+        try:
+            res = self._request("POST", url, soap_body, headers)
+        except HTTPError as ex:
+            if self._session_seq_num is not None:
+                self._session_seq_num -= 1
+            raise ex  # Pass to the next handler
+        if debug:
+            _LOGGER.debug("Response: %s", res)
+
+        return res, is_encrypted
+
+    def _build_soap_request(self, urn, action, params, body_elem):
+        """Return the SOAP body, headers and whether the command is encrypted."""
         is_encrypted = False
 
         # Encapsulate URN_REMOTE_CONTROL command in an X_EncryptedCommand if we're using encryption
@@ -235,7 +464,7 @@ class RemoteControl:
             if None not in [
                 self._session_key,
                 self._session_iv,
-                self._session_hmac_key,
+                self._session_hmac,
                 self._session_id,
                 self._session_seq_num,
             ]:
@@ -256,7 +485,7 @@ class RemoteControl:
                     encrypted_command,
                     self._session_key,
                     self._session_iv,
-                    self._session_hmac_key,
+                    self._session_hmac,
                 )
 
                 action = "X_EncryptedCommand"
@@ -270,111 +499,123 @@ class RemoteControl:
                     "Please refer to the docs for using encryption"
                 )
 
-        # Construct SOAP request
-        soap_body = (
-            '<?xml version="1.0" encoding="utf-8"?>'
-            '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
-            ' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">'
-            "<s:Body>"
-            f'<{body_elem}:{action} xmlns:{body_elem}="urn:{urn}">'
-            f"{params}"
-            f"</{body_elem}:{action}>"
-            "</s:Body>"
-            "</s:Envelope>"
-        ).encode("utf-8")
-
-        headers = {
-            "Host": f"{self._host}:{self._port}",
-            "Content-Length": len(soap_body),
-            "Content-Type": "text/xml; charset=utf-8",
-            "SOAPAction": f'"urn:{urn}#{action}"',
-        }
+        # Construct SOAP request, encrypted params differ on every call
+        if is_encrypted:
+            soap_body = _soap_envelope(urn, action, body_elem) % params.encode("utf-8")
+        else:
+            soap_body = _plain_soap_body(urn, action, body_elem, params)
 
-        url = URL_TEMPLATE.format(self._host, self._port, url)
+        # The headers only depend on the action, Content-Length is set by the client
+        headers = self._soap_action_headers.get((urn, action))
+        if headers is None:
+            headers = self._soap_action_headers[(urn, action)] = {
+                **self._soap_headers,
+                "SOAPAction": f'"urn:{urn}#{action}"',
+            }
 
-        _LOGGER.debug("Sending to %s:\n%s\n%s", url, headers, soap_body)
-        req = Request(url, soap_body, headers)
-        try:
-            res = urlopen(req, timeout=5).read()
-        except HTTPError as ex:
-            if self._session_seq_num is not None:
-                self._session_seq_num -= 1
-            raise ex  # Pass to the next handler
-        _LOGGER.debug("Response: %s", res)
+        return soap_body, headers, is_encrypted
 
+    def _parse_soap_response(self, res, is_encrypted):
+        """Decrypt the response of an encrypted command."""
         if is_encrypted:
-            root = ElementTree.fromstring(res)
-            enc_result = root.find(".//X_EncResult").text
+            enc_result = RE_ENC_RESULT.search(res).group(1)
             enc_result_decrypted = self._decrypt_soap_payload(
-                enc_result, self._session_key, self._session_iv, self._session_hmac_key
+                enc_result, self._session_key, self._session_iv, self._session_hmac
             )
             res = enc_result_decrypted
 
         return res
 
+    def _request(self, method, url, body=None, headers=None):
+        """Send a request to the TV, reusing a single keep-alive connection."""
+        with self._conn_lock:
+            # The TV may have closed a kept-alive connection in the meantime, in
+            # which case the request is retried once on a fresh connection.
+            reused = self._conn is not None
+            while True:
+                if self._conn is None:
+                    self._conn = _TVConnection(
+                        self._host, self._port, timeout=self._timeout
+                    )
+                try:
+                    self._conn.request(method, "/" + url, body, headers or {})
+                    response = self._conn.getresponse()
+                    res = response.read()
+                    break
+                except (http.client.HTTPException, OSError) as ex:
+                    # Drop the broken connection, the next request reconnects
+                    self._conn.close()
+                    self._conn = None
+                    if not reused or not isinstance(
+                        ex, (BrokenPipeError, ConnectionResetError)
+                    ):
+                        _raise_connection_error(ex)
+                    reused = False
+
+        if response.status >= 400:
+            raise HTTPError(
+                self._base_url + url,
+                response.status,
+                response.reason,
+                response.headers,
+                io.BytesIO(res),
+            )
+        return res
+
+    def close(self):
+        """Close the connection to the TV."""
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
     def _derive_session_keys(self):
         init_vector = bytearray(base64.b64decode(self._enc_key))
 
         self._session_iv = init_vector
 
-        # Get character codes from IV bytes
-        iv_vals = [c for c in init_vector]
+        # Derive key from IV
+        self._session_key = _swap_word_halves(init_vector)
 
-        # Initialise key character codes array
-        key_vals = [0] * 16
+        # HMAC key for comms is just the IV repeated twice. Keep a keyed HMAC around,
+        # copying it is cheaper than keying a new one for every command.
+        self._session_hmac = hmac.new(init_vector * 2, digestmod="sha256")
 
-        # Derive key from IV
-        i = 0
-        while i < 16:
-            key_vals[i] = iv_vals[i + 2]
-            key_vals[i + 1] = iv_vals[i + 3]
-            key_vals[i + 2] = iv_vals[i]
-            key_vals[i + 3] = iv_vals[i + 1]
-            i += 4
-
-        # Convert our key character codes to bytes
-        # self._session_key = ''.join(chr(c) for c in key_vals)
-        self._session_key = bytearray(c for c in key_vals)
-
-        # HMAC key for comms is just the IV repeated twice
-        self._session_hmac_key = init_vector * 2
-
-    def _encrypt_soap_payload(self, data, key, init_vector, hmac_key):
+    def _encrypt_soap_payload(self, data, key, init_vector, mac):
         # The encrypted payload must begin with a 16-byte header (12 random bytes, and 4 bytes for
         # the payload length in big endian)
         # Note: the server does not appear to ever send back valid payload lengths in bytes 13-16,
         # so I would assume these can also be randomized by the client, but we'll set them anyway
         # to be safe.
-        payload = bytearray(random.randint(0, 255) for _ in range(12))
-        payload += struct.pack(">I", len(data))
-        payload += data.encode("latin-1")
-
-        # For compatibility with both Python 2.x and 3.x, flattening types to 'str' or 'bytes'
-        init_vector = init_vector.decode("latin-1").encode("latin-1")
-        key = key.decode("latin-1").encode("latin-1")
-        payload = pad(payload.decode("latin-1")).encode("latin-1")
-        hmac_key = hmac_key.decode("latin-1").encode("latin-1")
-
-        # Initialize AES-CBC with key and IV
+        data = data.encode("latin-1")
+        size = 16 + len(data)
+        padded_size = size + BLOCK_SIZE - size % BLOCK_SIZE
+        # Zero-initialised, so the padding up to the block size is already in place.
+        # The 32 bytes at the end hold the HMAC once the payload is encrypted.
+        buf = bytearray(padded_size + 32)
+        buf[:12] = os.urandom(12)
+        struct.pack_into(">I", buf, 12, len(data))
+        buf[16:size] = data
+        payload = memoryview(buf)[:padded_size]
+
+        # Initialize AES-CBC with key and IV, both take bytes-like objects as is
         aes = AES.new(key, AES.MODE_CBC, init_vector)
-        # Encrypt with zero-padding
-        ciphertext = aes.encrypt(payload)
-        # Compute HMAC-SHA-256
-        sig = hmac.new(hmac_key, ciphertext, hashlib.sha256).digest()
-        # Concat HMAC with AES-encrypted payload
-        return base64.b64encode(ciphertext + sig).decode("latin-1")
-
-    def _decrypt_soap_payload(self, data, key, init_vector, hmac_key):
-        # For compatibility with both Python 2.x and 3.x, flattening types to 'str' or 'bytes'
-        key = key.decode("latin-1").encode("latin-1")
-        init_vector = init_vector.decode("latin-1").encode("latin-1")
-
+        # Encrypt in place
+        aes.encrypt(payload, output=payload)
+        # Append HMAC-SHA-256 of the ciphertext
+        mac = mac.copy()
+        mac.update(payload)
+        buf[padded_size:] = mac.digest()
+        return base64.b64encode(buf).decode("latin-1")
+
+    def _decrypt_soap_payload(self, data, key, init_vector, mac):
         # Initialize AES-CBC with key and IV
         aes = AES.new(key, AES.MODE_CBC, init_vector)
         # Decrypt
-        decrypted = aes.decrypt(base64.b64decode(data)).decode("latin-1")
-        # Unpad and return
-        return decrypted[16:].split("\0")[0]
+        decrypted = aes.decrypt(base64.b64decode(data))
+        # Strip the header, unpad and return
+        end = decrypted.find(b"\0", 16)
+        return decrypted[16 : end if end != -1 else None].decode("latin-1")
 
     def request_pin_code(self, name="My Remote"):
         # First let's ask for a pin code and get a challenge key back
@@ -388,13 +629,11 @@ class RemoteControl:
                 body_elem="u",
             )
         except HTTPError as ex:
-            if ex.code == 500:
-                xml = ElementTree.fromstring(ex.fp.read())
-                for child in xml.iter():
-                    if child.tag.endswith("errorDescription"):
-                        raise SOAPError(child.text)
-                return
-            raise ex  # Pass to the next handler
+            _raise_soap_fault(ex)
+            return
+        self._store_challenge(res)
+
+    def _store_challenge(self, res):
         root = ElementTree.fromstring(res)
         self._challenge = bytearray(
             base64.b64decode(root.find(".//X_ChallengeKey").text)
@@ -403,65 +642,11 @@ class RemoteControl:
     def authorize_pin_code(self, pincode):
         # Second, let's encrypt the pin code using the challenge key and send it back
         # to authenticate
-
-        # Derive key from IV
-        init_vector = self._challenge
-        key = bytearray([0] * 16)
-        i = 0
-        while i < 16:
-            key[i] = ~init_vector[i + 3] & 0xFF
-            key[i + 1] = ~init_vector[i + 2] & 0xFF
-            key[i + 2] = ~init_vector[i + 1] & 0xFF
-            key[i + 3] = ~init_vector[i] & 0xFF
-            i += 4
-
-        # Derive HMAC key from IV & HMAC key mask (taken from libtvconnect.so)
-        hmac_key_mask_vals = [
-            0x15,
-            0xC9,
-            0x5A,
-            0xC2,
-            0xB0,
-            0x8A,
-            0xA7,
-            0xEB,
-            0x4E,
-            0x22,
-            0x8F,
-            0x81,
-            0x1E,
-            0x34,
-            0xD0,
-            0x4F,
-            0xA5,
-            0x4B,
-            0xA7,
-            0xDC,
-            0xAC,
-            0x98,
-            0x79,
-            0xFA,
-            0x8A,
-            0xCD,
-            0xA3,
-            0xFC,
-            0x24,
-            0x4F,
-            0x38,
-            0x54,
-        ]
-        hmac_key = bytearray([0] * 32)
-        i = 0
-        while i < 32:
-            hmac_key[i] = hmac_key_mask_vals[i] ^ init_vector[(i + 2) & 0xF]
-            hmac_key[i + 1] = hmac_key_mask_vals[i + 1] ^ init_vector[(i + 3) & 0xF]
-            hmac_key[i + 2] = hmac_key_mask_vals[i + 2] ^ init_vector[i & 0xF]
-            hmac_key[i + 3] = hmac_key_mask_vals[i + 3] ^ init_vector[(i + 1) & 0xF]
-            i += 4
+        key, init_vector, mac = self._derive_pin_code_keys()
 
         # Encrypt X_PinCode argument and send it within an X_AuthInfo tag
         payload = self._encrypt_soap_payload(
-            f"<X_PinCode>{pincode}</X_PinCode>", key, init_vector, hmac_key
+            f"<X_PinCode>{pincode}</X_PinCode>", key, init_vector, mac
         )
         params = f"<X_AuthInfo>{payload}</X_AuthInfo>"
         try:
@@ -473,20 +658,34 @@ class RemoteControl:
                 body_elem="u",
             )
         except HTTPError as ex:
-            if ex.code == 500:
-                xml = ElementTree.fromstring(ex.fp.read())
-                for child in xml.iter():
-                    if child.tag.endswith("errorCode") and child.text == "600":
-                        raise SOAPError("Invalid PIN Code!")
-                    elif child.tag.endswith("errorDescription"):
-                        raise SOAPError(child.text)
-                return
-            raise ex  # Pass to the next handler
+            _raise_soap_fault(ex, {"600": "Invalid PIN Code!"})
+            return
+
+        self._store_auth_result(res, key, init_vector, mac)
+
+        # Request a session
+        self._request_session_id()
+
+    def _derive_pin_code_keys(self):
+        # Derive key from IV: byte-reverse and invert every 32-bit word
+        init_vector = self._challenge
+        key = struct.pack(
+            "<4I", *(~word & 0xFFFFFFFF for word in struct.unpack(">4I", init_vector))
+        )
+
+        # Derive HMAC key from IV & HMAC key mask, XORed as one 256-bit integer
+        rotated_iv = _swap_word_halves(init_vector) * 2
+        hmac_key = (
+            int.from_bytes(HMAC_KEY_MASK, "big") ^ int.from_bytes(rotated_iv, "big")
+        ).to_bytes(32, "big")
+
+        return key, init_vector, hmac.new(hmac_key, digestmod="sha256")
 
+    def _store_auth_result(self, res, key, init_vector, mac):
         # Parse and decrypt X_AuthResult
         root = ElementTree.fromstring(res)
         auth_result = root.find(".//X_AuthResult").text
-        payload = self._decrypt_soap_payload(auth_result, key, init_vector, hmac_key)
+        payload = self._decrypt_soap_payload(auth_result, key, init_vector, mac)
         auth_result_decrypted = ElementTree.fromstring(f"<X_Data>{payload}</X_Data>")
 
         # Set session application ID and encryption key
@@ -496,49 +695,44 @@ class RemoteControl:
         # Derive AES & HMAC keys from X_Keyword
         self._derive_session_keys()
 
-        # Request a session
-        self._request_session_id()
-
     def _request_session_id(self):
         # Thirdly, let's ask for a session. We'll need to use a valid session ID for encrypted
         # NRC commands.
+        try:
+            res = self.soap_request(
+                URL_CONTROL_NRC,
+                URN_REMOTE_CONTROL,
+                "X_GetEncryptSessionId",
+                self._session_id_params(),
+                body_elem="u",
+            )
+        except HTTPError as ex:
+            _raise_soap_fault(ex)
+            return
+
+        self._store_session_id(res)
 
+    def _session_id_params(self):
         # We need to send an encrypted version of X_ApplicationId
         encinfo = self._encrypt_soap_payload(
             "<X_ApplicationId>" + self._app_id + "</X_ApplicationId>",
             self._session_key,
             self._session_iv,
-            self._session_hmac_key,
+            self._session_hmac,
         )
 
         # Send the encrypted SOAP request along with plaintext X_ApplicationId
-        params = (
+        return (
             f"<X_ApplicationId>{self._app_id}</X_ApplicationId>"
             f"<X_EncInfo>{encinfo}</X_EncInfo>"
         )
-        try:
-            res = self.soap_request(
-                URL_CONTROL_NRC,
-                URN_REMOTE_CONTROL,
-                "X_GetEncryptSessionId",
-                params,
-                body_elem="u",
-            )
-        except HTTPError as ex:
-            if ex.code == 500:
-                xml = ElementTree.fromstring(ex.fp.read())
-                for child in xml.iter():
-                    if child.tag.endswith("errorDescription"):
-                        raise SOAPError(child.text)
-                return
-            raise ex  # Pass to the next handler
 
-        root = ElementTree.fromstring(res)
-        enc_result = root.find(".//X_EncResult").text
+    def _store_session_id(self, res):
+        enc_result = RE_ENC_RESULT.search(res).group(1)
         enc_result_decrypted = ElementTree.fromstring(
             "<X_Data>"
             + self._decrypt_soap_payload(
-                enc_result, self._session_key, self._session_iv, self._session_hmac_key
+                enc_result, self._session_key, self._session_iv, self._session_hmac
             )
             + "</X_Data>"
         )
@@ -552,50 +746,59 @@ class RemoteControl:
     # /__init__.py
     def _get_local_ip(self):
         """Try to determine the local IP address of the machine."""
+        if self._local_ip is not None:
+            return self._local_ip
+
+        sock = None
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-            # Use Google Public DNS server to determine own IP
-            sock.connect(("8.8.8.8", 80))
+            # Use the route to the TV to determine own IP, no packet is sent
+            sock.connect((self._host, self._port))
 
-            return sock.getsockname()[0]
+            self._local_ip = sock.getsockname()[0]
+            return self._local_ip
         except socket.error:
             try:
                 return socket.gethostbyname(socket.gethostname())
             except socket.gaierror:
                 return "127.0.0.1"
         finally:
-            sock.close()
+            if sock is not None:
+                sock.close()
 
     def _do_custom_request(self, method, url, headers=None, timeout=10):
-        opener = build_opener(HTTPHandler)
-        req = Request(url, headers=headers, method=method)
-        res = opener.open(req, timeout=timeout)
-
-        status = res.status
-        header = dict(res.info())
+        conn = _TVConnection(self._host, self._port, timeout=timeout)
+        try:
+            conn.request(method, "/" + url, headers=headers or {})
+            res = conn.getresponse()
+            body = res.read()
+        except (http.client.HTTPException, OSError) as ex:
+            _raise_connection_error(ex)
+        finally:
+            conn.close()
+
+        if res.status >= 400:
+            raise HTTPError(
+                self._base_url + url,
+                res.status,
+                res.reason,
+                res.headers,
+                io.BytesIO(body),
+            )
 
-        return status, header
+        return res.status, dict(res.headers)
 
     def upnp_service_subscribe(self, service, timeout=10):
         """Subscribe to a UPnP service."""
-        headers = {
-            "NT": "upnp:event",
-            "TIMEOUT": "Second-" + str(timeout),
-            "HOST": f"{self._host}:{self._port}",
-            "CALLBACK": f"<http://{self._listen_host}:{self._listen_port}/notify>",
-        }
-
         status, headers = self._do_custom_request(
             "SUBSCRIBE",
-            f"http://{self._host}:{self._port}/{service}",
-            headers=headers,
+            service,
+            headers=self._subscribe_headers(timeout),
             timeout=timeout,
         )
 
-        if "SID" in headers and headers["SID"]:
-            self._service_to_sid[service] = headers["SID"]
-            self._sid_to_service[headers["SID"]] = service
+        self._store_sid(service, headers)
 
         return status, headers
 
@@ -605,22 +808,14 @@ class RemoteControl:
             _LOGGER.error("Couldn't renew subscription of service %s", service)
             return
 
-        headers = {
-            "HOST": f"{self._host}:{self._port}",
-            "SID": self._service_to_sid[service],
-            "TIMEOUT": "Second-" + str(timeout),
-        }
-
         status, headers = self._do_custom_request(
             "SUBSCRIBE",
-            f"http://{self._host}:{self._port}/{service}",
-            headers=headers,
+            service,
+            headers=self._sid_headers(service, timeout),
             timeout=timeout,
         )
 
-        if "SID" in headers and headers["SID"]:
-            self._service_to_sid[service] = headers["SID"]
-            self._sid_to_service[headers["SID"]] = service
+        self._store_sid(service, headers)
 
         return status, headers
 
@@ -630,16 +825,10 @@ class RemoteControl:
             _LOGGER.debug("Couldn't unsubscribe from service %s", service)
             return
 
-        headers = {
-            "HOST": f"{self._host}:{self._port}",
-            "SID": self._service_to_sid[service],
-            "TIMEOUT": "Second-" + str(timeout),
-        }
-
         status, headers = self._do_custom_request(
             "UNSUBSCRIBE",
-            f"http://{self._host}:{self._port}/{service}",
-            headers=headers,
+            service,
+            headers=self._sid_headers(service, timeout),
             timeout=timeout,
         )
 
@@ -647,14 +836,39 @@ class RemoteControl:
 
         return status, headers
 
+    def _subscribe_headers(self, timeout):
+        return {
+            "NT": "upnp:event",
+            "TIMEOUT": "Second-" + str(timeout),
+            "HOST": self._host_header,
+            "CALLBACK": f"<http://{self._listen_host}:{self._listen_port}/notify>",
+        }
+
+    def _sid_headers(self, service, timeout):
+        return {
+            "HOST": self._host_header,
+            "SID": self._service_to_sid[service],
+            "TIMEOUT": "Second-" + str(timeout),
+        }
+
+    def _store_sid(self, service, headers):
+        if "SID" in headers and headers["SID"]:
+            self._service_to_sid[service] = headers["SID"]
+            self._sid_to_service[headers["SID"]] = service
+
     async def async_start_server(self):
         """Start the HTTP server."""
-        self._listen_host = self._listen_host or self._get_local_ip()
+        loop = asyncio.get_event_loop()
+        if not self._listen_host:
+            # Resolving the TV host may block, keep it off the event loop
+            self._listen_host = await loop.run_in_executor(None, self._get_local_ip)
 
         _LOGGER.debug("Creating server at %s:%d", self._listen_host, self._listen_port)
 
+        # aiohttp is slow to import, so only load it once the server is needed
+        import aiohttp.web
+
         self._aiohttp_server = aiohttp.web.Server(self._handle_request)
-        loop = asyncio.get_event_loop()
         try:
             self._server = await loop.create_server(
                 self._aiohttp_server, self._listen_host, self._listen_port
@@ -679,12 +893,14 @@ class RemoteControl:
 
     async def _handle_request(self, request):
         """Handle incoming requests."""
+        import aiohttp.web
+
         if request.method != "NOTIFY":
             _LOGGER.debug("Request received is not of method notify")
             return aiohttp.web.Response(status=405)
 
         headers = request.headers
-        body = await request.text()
+        body = await request.read()
 
         if "NT" not in headers or "NTS" not in headers:
             _LOGGER.debug("Sending response: %s", HTTPStatus.BAD_REQUEST)
@@ -703,7 +919,9 @@ class RemoteControl:
         if sid in self._sid_to_service:
             service = self._sid_to_service[sid]
 
-        body = body.strip().strip("\u0000")
+        # Parse the raw bytes, xmltodict would encode a str back to UTF-8 anyway.
+        # TVs pad the body with NUL bytes which expat rejects.
+        body = body.strip().strip(b"\x00")
         root = xmltodict.parse(body)
         properties = root["e:propertyset"]["e:property"]
 
@@ -727,69 +945,54 @@ class RemoteControl:
 
     def get_device_info(self):
         """Retrieve information from the TV."""
-        url = URL_TEMPLATE.format(self._host, self._port, URL_CONTROL_NRC_DDD)
-
-        res = urlopen(url, timeout=5).read()
+        res = self._request("GET", URL_CONTROL_NRC_DDD)
         device_info = xmltodict.parse(res)["root"]["device"]
 
         return device_info
 
     def open_webpage(self, url):
         """Launch Web Browser and open url."""
-        resource_id = 1063
-        params = (
-            "<X_AppType>vc_app</X_AppType>"
-            f"<X_LaunchKeyword>resource_id={resource_id}</X_LaunchKeyword>"
-        )
-        res = self.soap_request(
-            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_LaunchApp", params, body_elem="s"
-        )
-        root = ElementTree.fromstring(res)
-        el_session_id = root.find(".//X_SessionId")
-
-        # setup a server socket where URL will be served
-        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        localip = self._get_local_ip()
-        localport = random.randint(1025, 65535)
-        server_socket.bind((localip, localport))
-        server_socket.listen(1)
-        _LOGGER.debug("Listening on %s:%d", localip, localport)
+        packet = _webpage_packet(url)
 
-        params = (
-            "<X_AppType>vc_app</X_AppType>"
-            f"<X_SessionId>{el_session_id.text}</X_SessionId>"
-            "<X_ConnectKeyword>panasonic-viera 0.2</X_ConnectKeyword>"
-            f"<X_ConnectAddr>{localip}:{localport}</X_ConnectAddr>"
-        )
-
-        self.soap_request(
-            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_ConnectApp", params, body_elem="s"
+        res = self.soap_request(
+            URL_CONTROL_NRC,
+            URN_REMOTE_CONTROL,
+            "X_LaunchApp",
+            PARAMS_LAUNCH_WEB_BROWSER,
+            body_elem="s",
         )
 
-        sockfd, addr = server_socket.accept()
-        _LOGGER.debug("Client (%s, %s) connected" % addr)
-        packet = bytearray([0xF4, 0x01, 0x01, 0x00, 0x00, 0x00, 0x00, len(url)])
-        packet.extend(map(ord, url))
-        packet.append(0x00)
-        sockfd.send(packet)
-        sockfd.close()
+        # setup a server socket where URL will be served, on a port picked by the OS
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            localip = self._get_local_ip()
+            server_socket.bind((localip, 0))
+            localport = server_socket.getsockname()[1]
+            server_socket.listen(1)
+            # Don't wait forever for a TV that never connects back
+            server_socket.settimeout(10)
+            _LOGGER.debug("Listening on %s:%d", localip, localport)
+
+            self._send_soap_request(
+                URL_CONTROL_NRC,
+                URN_REMOTE_CONTROL,
+                "X_ConnectApp",
+                _connect_app_params(res, localip, localport),
+                body_elem="s",
+            )
 
-        server_socket.close()
+            sockfd, addr = server_socket.accept()
+            with sockfd:
+                _LOGGER.debug("Client (%s, %s) connected" % addr)
+                sockfd.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sockfd.sendall(packet)
 
     def get_apps(self):
         """Return the list of apps on the TV."""
         res = self.soap_request(
             URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_GetAppList", None
         )
-
-        apps = res.split("vc_app")[1:]
-        app_list = {}
-        for app in apps:
-            prod_id = re.search("(?<=product_id\=)(.*?)(?=&apos;)", app).group(0)
-            name = re.search("(?<=" + prod_id + "&apos;)(.*?)(?=&apos;)", app).group(0)
-            app_list[name] = prod_id
-        return app_list
+        return _parse_apps(res)
 
     def get_vector_info(self):
         """Return the vector info on the TV."""
@@ -801,62 +1004,52 @@ class RemoteControl:
 
     def get_volume(self):
         """Return the current volume level."""
-        params = "<InstanceID>0</InstanceID><Channel>Master</Channel>"
         res = self.soap_request(
-            URL_CONTROL_DMR, URN_RENDERING_CONTROL, "GetVolume", params
+            URL_CONTROL_DMR, URN_RENDERING_CONTROL, "GetVolume", PARAMS_MASTER_CHANNEL
         )
-        root = ElementTree.fromstring(res)
-        el_volume = root.find(".//CurrentVolume")
-        return int(el_volume.text)
+        return int(RE_CURRENT_VOLUME.search(res).group(1))
 
     def set_volume(self, volume):
         """Set a new volume level."""
-        if volume > 100 or volume < 0:
-            raise Exception(
-                "Bad request to volume control. " "Must be between 0 and 100"
-            )
-        params = (
-            "<InstanceID>0</InstanceID><Channel>Master</Channel>"
-            f"<DesiredVolume>{volume}</DesiredVolume>"
-        )
+        params = _volume_params(volume)
         self.soap_request(URL_CONTROL_DMR, URN_RENDERING_CONTROL, "SetVolume", params)
 
     def get_mute(self):
         """Return if the TV is muted."""
-        params = "<InstanceID>0</InstanceID><Channel>Master</Channel>"
         res = self.soap_request(
-            URL_CONTROL_DMR, URN_RENDERING_CONTROL, "GetMute", params
+            URL_CONTROL_DMR, URN_RENDERING_CONTROL, "GetMute", PARAMS_MASTER_CHANNEL
         )
-        root = ElementTree.fromstring(res)
-        el_mute = root.find(".//CurrentMute")
-        return el_mute.text != "0"
+        return RE_CURRENT_MUTE.search(res).group(1) != b"0"
 
     def set_mute(self, enable):
         """Mute or unmute the TV."""
-        data = "1" if enable else "0"
-        params = (
-            "<InstanceID>0</InstanceID><Channel>Master</Channel>"
-            f"<DesiredMute>{data}</DesiredMute>"
-        )
+        params = _mute_params(enable)
         self.soap_request(URL_CONTROL_DMR, URN_RENDERING_CONTROL, "SetMute", params)
 
     def send_key(self, key):
         """Send a key command to the TV."""
-        if isinstance(key, Keys):
-            key = key.value
-        params = f"<X_KeyEvent>{key}</X_KeyEvent>"
-        self.soap_request(URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_SendKey", params)
+        params = _key_event_params(key)
+        self._send_soap_request(
+            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_SendKey", params
+        )
+
+    def send_keys(self, keys, delay=0):
+        """Send several key commands to the TV over the same connection."""
+        for index, key in enumerate(keys):
+            if delay and index:
+                time.sleep(delay)
+            self.send_key(key)
+
+    def media_channel(self, digits):
+        """Enter a channel number by sending its digit keys."""
+        self.send_keys(_channel_keys(digits))
 
     def launch_app(self, app):
         """Launch an app."""
-        if isinstance(app, Apps):
-            app = app.value
-        params = "<X_AppType>vc_app</X_AppType><X_LaunchKeyword>"
-        if len(app) != 16:
-            params = params + f"resource_id={app}</X_LaunchKeyword>"
-        else:
-            params = params + f"product_id={app}</X_LaunchKeyword>"
-        self.soap_request(URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_LaunchApp", params)
+        params = _launch_app_params(app)
+        self._send_soap_request(
+            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_LaunchApp", params
+        )
 
     def turn_off(self):
         """Turn off media player."""
@@ -908,3 +1101,12 @@ class RemoteControl:
     def enc_key(self):
         """Return encryption key."""
         return self._enc_key
+
+
+def __getattr__(name):
+    """Import AsyncRemoteControl, and with it aiohttp, only when it is used."""
+    if name == "AsyncRemoteControl":
+        from .async_remote_control import AsyncRemoteControl
+
+        return AsyncRemoteControl
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,8 +2,7 @@
 Command line tool to remote control your Panasonic Viera TV.
 """
 from __future__ import print_function
-import argparse
-import code
+import functools
 import shlex
 import sys
 import socket
@@ -13,6 +12,25 @@ import panasonic_viera
 
 MSG_TV_SWITCHED_OFF = "TV is switched off."
 
+# Lines without these characters are tokenized the same by str.split and shlex
+SHLEX_CHARS = frozenset("\"'\\#")
+
+# Arguments that mean "off" for commands that take a boolean
+FALSE_VALUES = frozenset(("0", "false", "off", "no", ""))
+
+
+def _tv_guarded(method):
+    """Report a TV that can't be reached instead of failing the command."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        try:
+            return method(self, *args)
+        except (socket.timeout, TimeoutError, OSError):
+            print(MSG_TV_SWITCHED_OFF)
+
+    return wrapper
+
 
 class CommandRunner(object):
     """Runs defined commands."""
@@ -31,12 +49,18 @@ class CommandRunner(object):
         self.commands[name] = command_function
 
     def run(self, line):
-        tokens = shlex.split(line, comments=True)
+        if SHLEX_CHARS.isdisjoint(line):
+            tokens = line.split()
+        else:
+            tokens = shlex.split(line, comments=True)
+        if not tokens:
+            return
         command, args = tokens[0], tokens[1:]
-        if command not in self.commands:
+        command_function = self.commands.get(command)
+        if command_function is None:
             print(f"{command}: no such command", file=stderr)
             return
-        result = self.commands[command](*args)
+        result = command_function(*args)
         if result is not None:
             print(result)
 
@@ -50,11 +74,9 @@ class Console(object):
     def __init__(self, runner):
         self.runner = runner
 
-    def run(self, file_descriptor):
-        for line in file_descriptor:
-            self.runner.run(line)
-
     def interact(self, locals=None):
+        import code
+
         class LambdaConsole(code.InteractiveConsole):
             def runsource(code_console, source, filename=None, symbol=None):
                 try:
@@ -79,14 +101,15 @@ class Console(object):
         finally:
             sys.ps1, sys.ps2 = ps1, ps2
 
-    def run(self, file_descriptor=None):  # noqa: F811
+    def run(self, file_descriptor=None):
         if file_descriptor is None:
             file_descriptor = sys.stdin
         if file_descriptor.isatty():
             self.interact()
         else:
             try:
-                self.run(file_descriptor=file_descriptor)
+                for line in file_descriptor:
+                    self.runner.run(line)
             except Exception as err:
                 print(err, file=stderr)
                 return 1
@@ -99,90 +122,80 @@ class RemoteControl(object):
     def __init__(self, remote_control):
         self._remote_control = remote_control
 
+    @_tv_guarded
     def open_webpage(self, url):
-        try:
-            self._remote_control.open_webpage(url)
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        self._remote_control.open_webpage(url)
 
+    @_tv_guarded
     def get_volume(self):
-        try:
-            vol = self._remote_control.get_volume()
-            print(f"Volume is currently set to {vol}")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        vol = self._remote_control.get_volume()
+        print(f"Volume is currently set to {vol}")
 
+    @_tv_guarded
     def set_volume(self, vol):
         try:
+            vol = int(vol)
             self._remote_control.set_volume(vol)
-            print(f"Successfully set volume to {vol}")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        except ValueError:
+            print(
+                f"set_volume: {vol}: volume must be a number between 0 and 100",
+                file=stderr,
+            )
+            return
+        print(f"Successfully set volume to {vol}")
 
+    @_tv_guarded
     def get_mute(self):
-        try:
-            mute = self._remote_control.get_mute()
-            if mute:
-                print("TV is muted.")
-            else:
-                print("TV is not muted.")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        mute = self._remote_control.get_mute()
+        if mute:
+            print("TV is muted.")
+        else:
+            print("TV is not muted.")
 
+    @_tv_guarded
     def set_mute(self, mute):
-        try:
-            mute = bool(mute)
-            self._remote_control.set_mute(mute)
-            print(f"Successfully set mute to {mute}")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        mute = str(mute).lower() not in FALSE_VALUES
+        self._remote_control.set_mute(mute)
+        print(f"Successfully set mute to {mute}")
 
+    @_tv_guarded
     def turn_off(self):
-        try:
-            self._remote_control.turn_off()
-            print("Successfully turned TV off.")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        self._remote_control.turn_off()
+        print("Successfully turned TV off.")
 
+    @_tv_guarded
     def turn_on(self):
-        try:
-            self._remote_control.turn_on()
-            print("Successfully turned TV on.")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        self._remote_control.turn_on()
+        print("Successfully turned TV on.")
 
+    @_tv_guarded
     def volume_up(self):
-        try:
-            self._remote_control.volume_up()
-            print("Successfully turned volume up.")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        self._remote_control.volume_up()
+        print("Successfully turned volume up.")
 
+    @_tv_guarded
     def volume_down(self):
-        try:
-            self._remote_control.volume_down()
-            print("Successfully turned volume down.")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
+        self._remote_control.volume_down()
+        print("Successfully turned volume down.")
 
+    @_tv_guarded
     def mute_volume(self):
-        try:
-            self._remote_control.mute_volume()
-            print("Successfully muted volume.")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
-
-    def send_key(self, key):
-        try:
-            key = str(key)
-            self._remote_control.send_key(key)
+        self._remote_control.mute_volume()
+        print("Successfully muted volume.")
+
+    @_tv_guarded
+    def send_key(self, *keys):
+        keys = [str(key) for key in keys]
+        self._remote_control.send_keys(keys)
+        for key in keys:
             print(f"Successfully sent key {key}.")
-        except (socket.timeout, TimeoutError, OSError):
-            print(MSG_TV_SWITCHED_OFF)
 
 
-def main():
-    """Handle command line execution."""
+@functools.lru_cache(maxsize=None)
+def _get_parser():
+    """Build the command line parser once."""
+    import argparse
+
     parser = argparse.ArgumentParser(
         prog="panasonic_viera", description="Remote control a Panasonic Viera TV."
     )
@@ -200,6 +213,16 @@ def main():
             f"Defaults to {panasonic_viera.DEFAULT_PORT}."
         ),
     )
+    parser.add_argument(
+        "--timeout",
+        dest="timeout",
+        type=float,
+        default=panasonic_viera.DEFAULT_TIMEOUT,
+        help=(
+            "Seconds to wait for the TV before giving up. "
+            f"Defaults to {panasonic_viera.DEFAULT_TIMEOUT}."
+        ),
+    )
     parser.add_argument(
         "--verbose",
         dest="verbose",
@@ -208,26 +231,43 @@ def main():
         default=False,
         help="debug output",
     )
-    args = parser.parse_args()
+    return parser
+
+
+def main(argv=None):
+    """Handle command line execution."""
+    args = _get_parser().parse_args(argv)
 
     if args.verbose:
         logging.basicConfig(level=logging.DEBUG)
 
-    remote_control = RemoteControl(panasonic_viera.RemoteControl(args.host, args.port))
+    # All commands share the library's kept-alive connection to the TV
+    try:
+        tv = panasonic_viera.RemoteControl(args.host, args.port, timeout=args.timeout)
+    except (socket.timeout, TimeoutError, OSError):
+        print(MSG_TV_SWITCHED_OFF, file=stderr)
+        return 1
+    remote_control = RemoteControl(tv)
     runner = CommandRunner()
-    runner.command("open_webpage", remote_control.open_webpage)
-    runner.command("get_volume", remote_control.get_volume)
-    runner.command("set_volume", remote_control.set_volume)
-    runner.command("get_mute", remote_control.get_mute)
-    runner.command("set_mute", remote_control.set_mute)
-    runner.command("turn_off", remote_control.turn_off)
-    runner.command("volume_up", remote_control.volume_up)
-    runner.command("volume_down", remote_control.volume_down)
-    runner.command("mute_volume", remote_control.mute_volume)
-    runner.command("turn_off", remote_control.turn_off)
-    runner.command("turn_on", remote_control.turn_on)
-    runner.command("send_key", remote_control.send_key)
-    return Console(runner).run()
+    runner.commands.update(
+        {
+            "open_webpage": remote_control.open_webpage,
+            "get_volume": remote_control.get_volume,
+            "set_volume": remote_control.set_volume,
+            "get_mute": remote_control.get_mute,
+            "set_mute": remote_control.set_mute,
+            "turn_off": remote_control.turn_off,
+            "turn_on": remote_control.turn_on,
+            "volume_up": remote_control.volume_up,
+            "volume_down": remote_control.volume_down,
+            "mute_volume": remote_control.mute_volume,
+            "send_key": remote_control.send_key,
+        }
+    )
+    try:
+        return Console(runner).run()
+    finally:
+        tv.close()
 
 
 if __name__ == "__main__":
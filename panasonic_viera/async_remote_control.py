@@ -0,0 +1,429 @@
+"""Module to interact with your Panasonic Viera TV using asyncio."""
+import asyncio
+import io
+import logging
+import socket
+from urllib.error import HTTPError
+
+import aiohttp
+import xmltodict
+
+from . import (
+    DEFAULT_PORT,
+    DEFAULT_TIMEOUT,
+    PARAMS_LAUNCH_WEB_BROWSER,
+    PARAMS_MASTER_CHANNEL,
+    RE_CURRENT_MUTE,
+    RE_CURRENT_VOLUME,
+    TV_TYPE_ENCRYPTED,
+    URL_CONTROL_DMR,
+    URL_CONTROL_NRC,
+    URL_CONTROL_NRC_DDD,
+    URL_CONTROL_NRC_DEF,
+    URN_REMOTE_CONTROL,
+    URN_RENDERING_CONTROL,
+    Keys,
+    RemoteControl,
+    _channel_keys,
+    _connect_app_params,
+    _key_event_params,
+    _launch_app_params,
+    _mute_params,
+    _parse_apps,
+    _raise_soap_fault,
+    _volume_params,
+    _webpage_packet,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AsyncRemoteControl(RemoteControl):
+    """This class represents a Panasonic Viera TV Remote Control using asyncio.
+
+    Nothing is sent to the TV until async_setup() is awaited. Several TVs can then
+    be controlled concurrently, e.g. with asyncio.gather().
+    """
+
+    def __init__(
+        self,
+        host,
+        port=DEFAULT_PORT,
+        app_id=None,
+        encryption_key=None,
+        listen_host=None,
+        listen_port=DEFAULT_PORT,
+        session=None,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        """Initialise the remote control."""
+        self._session = session
+        self._owns_session = session is None
+        self._pending_queries = {}
+        super().__init__(
+            host, port, app_id, encryption_key, listen_host, listen_port, timeout
+        )
+
+    def _setup(self):
+        """Defer talking to the TV to async_setup()."""
+
+    async def async_setup(self):
+        """Request a session, or determine if the TV uses encryption or not."""
+        if self._type == TV_TYPE_ENCRYPTED:
+            await self._async_request_session_id()
+            return
+
+        _LOGGER.debug("Determining TV type\n")
+        _, res = await self._async_request("GET", URL_CONTROL_NRC_DEF)
+        self._detect_type(res)
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=1, force_close=False)
+            )
+        return self._session
+
+    async def aclose(self):
+        """Close the HTTP session to the TV."""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+        self.close()
+
+    async def _async_request(self, method, url, body=None, headers=None, timeout=None):
+        """Send a request to the TV and return the response and its body."""
+        if timeout is None:
+            timeout = self._timeout
+        # The TV may have closed a kept-alive connection in the meantime, in which
+        # case the request is retried once on a fresh connection.
+        for retry in (True, False):
+            try:
+                async with self._get_session().request(
+                    method,
+                    self._base_url + url,
+                    data=body,
+                    headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                ) as response:
+                    res = await response.read()
+                break
+            except aiohttp.ClientConnectorError:
+                raise
+            except (aiohttp.ClientOSError, aiohttp.ServerDisconnectedError):
+                if not retry:
+                    raise
+
+        if response.status >= 400:
+            raise HTTPError(
+                self._base_url + url,
+                response.status,
+                response.reason,
+                response.headers,
+                io.BytesIO(res),
+            )
+        return response, res
+
+    async def async_soap_request(self, url, urn, action, params, body_elem="m"):
+        """Send a SOAP request to the TV."""
+        res, is_encrypted = await self._async_send_soap_request(
+            url, urn, action, params, body_elem
+        )
+        return self._parse_soap_response(res, is_encrypted)
+
+    async def _async_send_soap_request(self, url, urn, action, params, body_elem="m"):
+        """Send a SOAP request and return the raw response, without decrypting it."""
+        soap_body, headers, is_encrypted = self._build_soap_request(
+            urn, action, params, body_elem
+        )
+
+        debug = _LOGGER.isEnabledFor(logging.DEBUG)
+        if debug:
+            _LOGGER.debug("Sending to %s:\n%s\n%s", url, headers, soap_body)
+        try:
+            _, res = await self._async_request("POST", url, soap_body, headers)
+        except HTTPError as ex:
+            if self._session_seq_num is not None:
+                self._session_seq_num -= 1
+            raise ex  # Pass to the next handler
+        if debug:
+            _LOGGER.debug("Response: %s", res)
+
+        return res, is_encrypted
+
+    async def _async_request_session_id(self):
+        try:
+            res = await self.async_soap_request(
+                URL_CONTROL_NRC,
+                URN_REMOTE_CONTROL,
+                "X_GetEncryptSessionId",
+                self._session_id_params(),
+                body_elem="u",
+            )
+        except HTTPError as ex:
+            _raise_soap_fault(ex)
+            return
+
+        self._store_session_id(res)
+
+    async def async_request_pin_code(self, name="My Remote"):
+        """Make the TV display a pairing pin code."""
+        params = "<X_DeviceName>" + name + "</X_DeviceName>"
+        try:
+            res = await self.async_soap_request(
+                URL_CONTROL_NRC,
+                URN_REMOTE_CONTROL,
+                "X_DisplayPinCode",
+                params,
+                body_elem="u",
+            )
+        except HTTPError as ex:
+            _raise_soap_fault(ex)
+            return
+        self._store_challenge(res)
+
+    async def async_authorize_pin_code(self, pincode):
+        """Authorize the displayed pin code and request an encrypted session."""
+        key, init_vector, mac = self._derive_pin_code_keys()
+        payload = self._encrypt_soap_payload(
+            f"<X_PinCode>{pincode}</X_PinCode>", key, init_vector, mac
+        )
+        params = f"<X_AuthInfo>{payload}</X_AuthInfo>"
+        try:
+            res = await self.async_soap_request(
+                URL_CONTROL_NRC,
+                URN_REMOTE_CONTROL,
+                "X_RequestAuth",
+                params,
+                body_elem="u",
+            )
+        except HTTPError as ex:
+            _raise_soap_fault(ex, {"600": "Invalid PIN Code!"})
+            return
+
+        self._store_auth_result(res, key, init_vector, mac)
+        await self._async_request_session_id()
+
+    async def _async_do_custom_request(self, method, url, headers, timeout):
+        response, _ = await self._async_request(
+            method, url, headers=headers, timeout=timeout
+        )
+        return response.status, dict(response.headers)
+
+    async def async_upnp_service_subscribe(self, service, timeout=10):
+        """Subscribe to a UPnP service."""
+        status, headers = await self._async_do_custom_request(
+            "SUBSCRIBE", service, self._subscribe_headers(timeout), timeout
+        )
+
+        self._store_sid(service, headers)
+
+        return status, headers
+
+    async def async_upnp_service_resubscribe(self, service, timeout=10):
+        """Renew subscription to a UPnP service."""
+        if service not in self._service_to_sid:
+            _LOGGER.error("Couldn't renew subscription of service %s", service)
+            return
+
+        status, headers = await self._async_do_custom_request(
+            "SUBSCRIBE", service, self._sid_headers(service, timeout), timeout
+        )
+
+        self._store_sid(service, headers)
+
+        return status, headers
+
+    async def async_upnp_service_unsubscribe(self, service, timeout=10):
+        """Unsubscribe from a UPnP service."""
+        if service not in self._service_to_sid:
+            _LOGGER.debug("Couldn't unsubscribe from service %s", service)
+            return
+
+        status, headers = await self._async_do_custom_request(
+            "UNSUBSCRIBE", service, self._sid_headers(service, timeout), timeout
+        )
+
+        self._service_to_sid.pop(service)
+
+        return status, headers
+
+    async def async_get_device_info(self):
+        """Retrieve information from the TV."""
+        _, res = await self._async_request("GET", URL_CONTROL_NRC_DDD)
+        return xmltodict.parse(res)["root"]["device"]
+
+    async def _async_query(self, action):
+        """Send a rendering control query, sharing it with identical ones in flight.
+
+        Concurrent callers asking for the same state get the result of a single
+        request instead of each sending their own.
+        """
+        task = self._pending_queries.get(action)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.async_soap_request(
+                    URL_CONTROL_DMR,
+                    URN_RENDERING_CONTROL,
+                    action,
+                    PARAMS_MASTER_CHANNEL,
+                )
+            )
+            self._pending_queries[action] = task
+
+            def _done(_):
+                if self._pending_queries.get(action) is task:
+                    del self._pending_queries[action]
+
+            task.add_done_callback(_done)
+        # Don't let one cancelled caller cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _invalidate_queries(self):
+        """Make queries issued after a state change not reuse earlier results."""
+        self._pending_queries.clear()
+
+    async def async_get_volume(self):
+        """Return the current volume level."""
+        res = await self._async_query("GetVolume")
+        return int(RE_CURRENT_VOLUME.search(res).group(1))
+
+    async def async_set_volume(self, volume):
+        """Set a new volume level."""
+        params = _volume_params(volume)
+        self._invalidate_queries()
+        await self.async_soap_request(
+            URL_CONTROL_DMR, URN_RENDERING_CONTROL, "SetVolume", params
+        )
+
+    async def async_get_mute(self):
+        """Return if the TV is muted."""
+        res = await self._async_query("GetMute")
+        return RE_CURRENT_MUTE.search(res).group(1) != b"0"
+
+    async def async_set_mute(self, enable):
+        """Mute or unmute the TV."""
+        params = _mute_params(enable)
+        self._invalidate_queries()
+        await self.async_soap_request(
+            URL_CONTROL_DMR, URN_RENDERING_CONTROL, "SetMute", params
+        )
+
+    async def async_send_key(self, key):
+        """Send a key command to the TV."""
+        params = _key_event_params(key)
+        # Keys such as VOLUME_UP or MUTE change the state as well
+        self._invalidate_queries()
+        await self._async_send_soap_request(
+            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_SendKey", params
+        )
+
+    async def async_send_keys(self, keys, delay=0):
+        """Send several key commands to the TV over the same connection.
+
+        The keys are sent one after the other, the TV has to receive them in order.
+        """
+        for index, key in enumerate(keys):
+            if delay and index:
+                await asyncio.sleep(delay)
+            await self.async_send_key(key)
+
+    async def async_media_channel(self, digits):
+        """Enter a channel number by sending its digit keys."""
+        await self.async_send_keys(_channel_keys(digits))
+
+    async def async_launch_app(self, app):
+        """Launch an app."""
+        params = _launch_app_params(app)
+        await self._async_send_soap_request(
+            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_LaunchApp", params
+        )
+
+    async def async_open_webpage(self, url):
+        """Launch Web Browser and open url."""
+        packet = _webpage_packet(url)
+
+        res = await self.async_soap_request(
+            URL_CONTROL_NRC,
+            URN_REMOTE_CONTROL,
+            "X_LaunchApp",
+            PARAMS_LAUNCH_WEB_BROWSER,
+            body_elem="s",
+        )
+
+        loop = asyncio.get_running_loop()
+        # Resolving the TV host may block, keep it off the event loop
+        localip = await loop.run_in_executor(None, self._get_local_ip)
+
+        # setup a server socket where URL will be served, on a port picked by the OS
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server_socket.bind((localip, 0))
+            localport = server_socket.getsockname()[1]
+            server_socket.listen(1)
+            server_socket.setblocking(False)
+            _LOGGER.debug("Listening on %s:%d", localip, localport)
+
+            await self._async_send_soap_request(
+                URL_CONTROL_NRC,
+                URN_REMOTE_CONTROL,
+                "X_ConnectApp",
+                _connect_app_params(res, localip, localport),
+                body_elem="s",
+            )
+
+            # Don't wait forever for a TV that never connects back
+            sockfd, addr = await asyncio.wait_for(loop.sock_accept(server_socket), 10)
+            with sockfd:
+                _LOGGER.debug("Client (%s, %s) connected" % addr)
+                sockfd.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                await loop.sock_sendall(sockfd, packet)
+
+    async def async_get_apps(self):
+        """Return the list of apps on the TV."""
+        res = await self.async_soap_request(
+            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_GetAppList", None
+        )
+        return _parse_apps(res)
+
+    async def async_get_vector_info(self):
+        """Return the vector info on the TV."""
+        return await self.async_soap_request(
+            URL_CONTROL_NRC, URN_REMOTE_CONTROL, "X_GetVectorInfo", None
+        )
+
+    async def async_turn_off(self):
+        """Turn off media player."""
+        await self.async_send_key(Keys.POWER)
+
+    async def async_turn_on(self):
+        """Turn on media player."""
+        await self.async_send_key(Keys.POWER)
+
+    async def async_volume_up(self):
+        """Volume up the media player."""
+        await self.async_send_key(Keys.VOLUME_UP)
+
+    async def async_volume_down(self):
+        """Volume down media player."""
+        await self.async_send_key(Keys.VOLUME_DOWN)
+
+    async def async_mute_volume(self):
+        """Send mute command."""
+        await self.async_send_key(Keys.MUTE)
+
+    async def async_media_play(self):
+        """Send play command."""
+        await self.async_send_key(Keys.PLAY)
+
+    async def async_media_pause(self):
+        """Send media pause command to media player."""
+        await self.async_send_key(Keys.PAUSE)
+
+    async def async_media_next_track(self):
+        """Send next track command."""
+        await self.async_send_key(Keys.FAST_FORWARD)
+
+    async def async_media_previous_track(self):
+        """Send the previous track command."""
+        await self.async_send_key(Keys.REWIND)